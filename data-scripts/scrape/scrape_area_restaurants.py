@@ -1,12 +1,48 @@
-import requests
-import json
+import asyncio
+import diskcache
+import hashlib
+import httpx
+import logging
+import orjson
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 import uuid
 
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket that caps how many requests are started per second."""
+    def __init__(self, requests_per_second: float):
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        self.rate = requests_per_second
+        self.capacity = max(1.0, requests_per_second)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and consume it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 class ZomatoScraper:
+    _POSTBACK_PLACEHOLDER = "__POSTBACK_PARAMS__"
+    # Pre-serialized filter keys; these never change between scrapers or pages
+    _CAT_POSTKEY = '{"category_context":"go_out_home"}'
+    _CTX_POSTKEY = '{"context":"dineout_home"}'
+
     def __init__(self, city_id: int, latitude: float, longitude: float, csrf_token: str, 
-                 entity_id: int, entity_type: str, cookies: Dict[str, str]):
+                 entity_id: int, entity_type: str, cookies: Dict[str, str],
+                 requests_per_second: float = 2, max_concurrent: int = 5,
+                 cache_dir: Optional[str] = None, cache_expire: int = 3600):
         """
         Initialize the Zomato scraper with required parameters and authentication.
         
@@ -18,6 +54,11 @@ class ZomatoScraper:
             entity_id: Location entity ID
             entity_type: Location entity type (e.g., 'subzone')
             cookies: Dictionary of required cookies
+            requests_per_second: Maximum number of requests started per second
+            max_concurrent: Maximum number of requests in flight at once
+            cache_dir: Directory for an on-disk cache of scrape results during
+                development, or None (the default) to always fetch
+            cache_expire: Seconds before a cached result is scraped again
         """
         self.base_url = 'https://www.zomato.com/webroutes/search/home'
         self.city_id = city_id
@@ -28,8 +69,17 @@ class ZomatoScraper:
         self.entity_type = entity_type
         self.search_id = str(uuid.uuid4())
         self.cookies = cookies
+        # Limiter and semaphore are created per scrape, since asyncio primitives bind to one event loop
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.requests_per_second = requests_per_second
+        self.max_concurrent = max_concurrent
+        self.cache = diskcache.Cache(cache_dir) if cache_dir else None
+        self.cache_expire = cache_expire
         
-        # Complete headers from the original request
+        # Headers from the original request; Connection is left to the HTTP/2 client
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:131.0) Gecko/20100101 Firefox/131.0',
             'Accept': '*/*',
@@ -38,59 +88,58 @@ class ZomatoScraper:
             'Content-Type': 'application/json',
             'x-zomato-csrft': csrf_token,
             'Origin': 'https://www.zomato.com',
-            'Connection': 'keep-alive',
             'Sec-Fetch-Dest': 'empty',
             'Sec-Fetch-Mode': 'cors',
             'Sec-Fetch-Site': 'same-origin',
             'Cache-Control': 'no-cache',
             'Pragma': 'no-cache',
         }
+        
+        self._build_payload_template()
 
-    def _create_payload(self, page: int = 1) -> Dict:
-        """Create the request payload with all required metadata."""
-        payload = {
-            "context": "dineout",
-            "filters": json.dumps({
-                "searchMetadata": {
-                    "previousSearchParams": json.dumps({
-                        "PreviousSearchId": self.search_id,
-                        "PreviousSearchFilter": [
-                            json.dumps({"category_context": "go_out_home"}),
-                            "",
-                            json.dumps({"context": "dineout_home"})
-                        ]
-                    }),
-                    "postbackParams": json.dumps({
-                        "total_restaurants_shown": (page - 1) * 15,
-                        "total_results_shown": (page - 1) * 15,
-                        "page": page,
-                        "solr_offset": (page - 1) * 15,
-                        "vg_set": True,
-                        "search_id": self.search_id
-                    }),
-                    "totalResults": 1115,
-                    "hasMore": True,
-                    "getInactive": False
+    def _build_payload_template(self):
+        """Build the parts of the payload that stay the same for every page."""
+        filters = {
+            "searchMetadata": {
+                "previousSearchParams": orjson.dumps({
+                    "PreviousSearchId": self.search_id,
+                    "PreviousSearchFilter": [
+                        self._CAT_POSTKEY,
+                        "",
+                        self._CTX_POSTKEY
+                    ]
+                }).decode(),
+                "postbackParams": self._POSTBACK_PLACEHOLDER,
+                "totalResults": 1115,
+                "hasMore": True,
+                "getInactive": False
+            },
+            "dineoutAdsMetaData": {},
+            "appliedFilter": [
+                {
+                    "filterType": "category_sheet",
+                    "filterValue": "go_out_home",
+                    "isHidden": True,
+                    "isApplied": True,
+                    "postKey": self._CAT_POSTKEY
                 },
-                "dineoutAdsMetaData": {},
-                "appliedFilter": [
-                    {
-                        "filterType": "category_sheet",
-                        "filterValue": "go_out_home",
-                        "isHidden": True,
-                        "isApplied": True,
-                        "postKey": json.dumps({"category_context": "go_out_home"})
-                    },
-                    {
-                        "filterType": "context",
-                        "filterValue": "dineout_home",
-                        "isHidden": True,
-                        "isApplied": True,
-                        "postKey": json.dumps({"context": "dineout_home"})
-                    }
-                ],
-                "urlParamsForAds": {}
-            }),
+                {
+                    "filterType": "context",
+                    "filterValue": "dineout_home",
+                    "isHidden": True,
+                    "isApplied": True,
+                    "postKey": self._CTX_POSTKEY
+                }
+            ],
+            "urlParamsForAds": {}
+        }
+        # Serialized once; only the quoted placeholder is swapped per page
+        self._filters_template = orjson.dumps(filters).decode()
+        self._postback_marker = orjson.dumps(self._POSTBACK_PLACEHOLDER).decode()
+        
+        self._static_payload = {
+            "context": "dineout",
+            "filters": None,  # Filled in per page
             "addressId": 0,
             "entityId": self.entity_id,
             "entityType": self.entity_type,
@@ -120,11 +169,63 @@ class ZomatoScraper:
             "address_template": [],
             "otherRestaurantsUrl": ""
         }
+
+    def _create_payload(self, page: int = 1) -> Dict:
+        """Create the request payload for a page from the prebuilt template."""
+        postback = orjson.dumps({
+            "total_restaurants_shown": (page - 1) * 15,
+            "total_results_shown": (page - 1) * 15,
+            "page": page,
+            "solr_offset": (page - 1) * 15,
+            "vg_set": True,
+            "search_id": self.search_id
+        })
+        payload = self._static_payload.copy()
+        payload["filters"] = self._filters_template.replace(
+            self._postback_marker, orjson.dumps(postback.decode()).decode(), 1
+        )
         return payload
 
-    def scrape_restaurants(self, max_pages: int = 5) -> List[Dict]:
+    def _cache_key(self, max_pages: int) -> str:
+        """Cache key for a whole scrape; the per-run search id is left out so keys survive re-runs."""
+        key = orjson.dumps([self.city_id, self.entity_type, self.entity_id, max_pages])
+        return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+    async def _fetch_page(self, client: httpx.AsyncClient, limiter: RateLimiter,
+                          semaphore: asyncio.Semaphore, page: int) -> Dict:
+        """Fetch a single page of search results and return the decoded JSON."""
+        payload = self._create_payload(page)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sending request for page %d with payload: %s", page,
+                         orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode())
+        
+        await limiter.acquire()
+        async with semaphore:
+            response = await client.post(self.base_url, json=payload)
+            
+            # Raw bytes go straight to orjson; the body is only decoded to text for logging
+            body = response.content
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Page %d response status code: %d (%s)", page, response.status_code,
+                             response.http_version)
+                logger.debug("Response headers: %s", dict(response.headers))
+                logger.debug("Response content: %s", body[:500].decode(errors='replace'))
+            
+            try:
+                data = orjson.loads(body)
+            except orjson.JSONDecodeError as e:
+                logger.error("Failed to decode JSON response: %s", e)
+                logger.error("Full response content: %s", body.decode(errors='replace'))
+                raise
+            
+            return data
+
+    async def scrape_restaurants(self, max_pages: int = 5) -> List[Dict]:
         """
-        Scrape restaurant data from multiple pages.
+        Scrape restaurant data from multiple pages concurrently.
+        
+        The payload for every page is known up front, so all pages are
+        requested at once and processed in page order afterwards.
         
         Args:
             max_pages: Maximum number of pages to scrape
@@ -132,34 +233,38 @@ class ZomatoScraper:
         Returns:
             List of dictionaries containing restaurant information
         """
+        # Whole results are cached, so pages from different search sessions never mix
+        key = self._cache_key(max_pages)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info("Serving %d restaurants from cache", len(cached))
+                return cached
+        
         all_restaurants = []
+        limiter = RateLimiter(self.requests_per_second)
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        
+        # HTTP/2 multiplexes the concurrent page requests over a single connection
+        limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
+        async with httpx.AsyncClient(http2=True, headers=self.headers, cookies=self.cookies,
+                                     limits=limits, timeout=15.0) as client:
+            tasks = [self._fetch_page(client, limiter, semaphore, page)
+                     for page in range(1, max_pages + 1)]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        for page in range(1, max_pages + 1):
+        failed = False
+        for page, data in enumerate(results, start=1):
+            if isinstance(data, Exception):
+                logger.error("Error on page %d: %s", page, data)
+                failed = True
+                break
+            
+            if 'sections' not in data or 'SECTION_SEARCH_RESULT' not in data['sections']:
+                logger.info("No more results on page %d", page)
+                break
+            
             try:
-                payload = self._create_payload(page)
-                print("\nSending request with payload:", json.dumps(payload, indent=2))
-                
-                response = requests.post(
-                    self.base_url,
-                    headers=self.headers,
-                    cookies=self.cookies,
-                    json=payload
-                )
-                
-                print("\nResponse status code:", response.status_code)
-                print("Response headers:", dict(response.headers))
-                
-                try:
-                    print("\nResponse content:", response.text[:500])  # Print first 500 chars of response
-                    data = response.json()
-                except json.JSONDecodeError as e:
-                    print(f"\nFailed to decode JSON response: {str(e)}")
-                    print("Full response content:", response.text)
-                    raise
-                if 'sections' not in data or 'SECTION_SEARCH_RESULT' not in data['sections']:
-                    print(f"No more results on page {page}")
-                    break
-                
                 restaurants = data['sections']['SECTION_SEARCH_RESULT']
                 for restaurant in restaurants:
                     if restaurant['type'] == 'restaurant':
@@ -172,14 +277,18 @@ class ZomatoScraper:
                             'cost_for_two': info.get('cft', {}).get('text', 'N/A'),
                             'address': info['locality']['address'] if 'locality' in info else 'N/A'
                         })
-                
-                print(f"Scraped page {page} - Found {len(restaurants)} restaurants")
-                time.sleep(1)  # Rate limiting
+            
+                logger.info("Scraped page %d - Found %d restaurants", page, len(restaurants))
                 
             except Exception as e:
-                print(f"Error on page {page}: {str(e)}")
+                logger.error("Error on page %d: %s", page, e)
+                failed = True
                 break
         
+        # Only complete scrapes are cached, so a failed page is retried next time
+        if self.cache is not None and not failed:
+            self.cache.set(key, all_restaurants, expire=self.cache_expire)
+        
         return all_restaurants
 
 def parse_cookies_from_string(cookie_string: str) -> Dict[str, str]:
@@ -189,10 +298,13 @@ def parse_cookies_from_string(cookie_string: str) -> Dict[str, str]:
         if '=' in cookie:
             name, value = cookie.split('=', 1)
             cookies[name] = value.strip('"')  # Remove any quotes
-    print("\nParsed cookies:", json.dumps(cookies, indent=2))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Parsed cookies: %s", orjson.dumps(cookies, option=orjson.OPT_INDENT_2).decode())
     return cookies
 
-def main():
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    
     # Cookie string from the original request
     cookie_string = """AWSALBTG=QB6x9itPuxwiOcVW0eFaJIeX0QQkVQ4rXwJ2WkXl0j7Ia4pbIvN3A1eI6wwjJlQxW+W654tFMVoDGBRZ2LMHTM1QpphyTFkk78vfZkbT+EYNCzfzsRcFJwGig22lPEgte90mSoTUkPVg0jlkheLfoHUdOaZvP1HEodPZITJoerzv; AWSALBTGCORS=QB6x9itPuxwiOcVW0eFaJIeX0QQkVQ4rXwJ2WkXl0j7Ia4pbIvN3A1eI6wwjJlQxW+W654tFMVoDGBRZ2LMHTM1QpphyTFkk78vfZkbT+EYNCzfzsRcFJwGig22lPEgte90mSoTUkPVg0jlkheLfoHUdOaZvP1HEodPZITJoerzv; fbcity=31; fre=0; rd=1380000; zl=en; fbtrack=c1e5f5e9fe70e75e1ece20da5ba894c1; ltv=83931; lty=83931; csrf=745a72b5770f93f1ab402c1591c9b276; PHPSESSID=e494a3d5b4221fd2ba1af3111fc8e8f4"""
     
@@ -209,13 +321,13 @@ def main():
         cookies=cookies
     )
     
-    restaurants = scraper.scrape_restaurants(max_pages=5)
+    restaurants = await scraper.scrape_restaurants(max_pages=5)
     
     # Save results to JSON file
-    with open('restaurants.json', 'w', encoding='utf-8') as f:
-        json.dump(restaurants, f, indent=2, ensure_ascii=False)
+    with open('restaurants.json', 'wb') as f:
+        f.write(orjson.dumps(restaurants, option=orjson.OPT_INDENT_2))
     
-    print(f"\nTotal restaurants collected: {len(restaurants)}")
+    logger.info("Total restaurants collected: %d", len(restaurants))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
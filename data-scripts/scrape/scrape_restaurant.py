@@ -1,14 +1,72 @@
-import json
-import pandas as pd
-from bs4 import BeautifulSoup
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import diskcache
+import functools
+import hashlib
+import httpx
+import io
+import ijson
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Retry policy for transient failures, shared by the sync and async fetchers
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+def create_session() -> requests.Session:
+    """Create a session that keeps connections alive and retries transient errors"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retries = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+# Shared session so repeated fetches reuse the same connection pool
+session = create_session()
+
+# Seconds an extracted preloaded state stays in the optional on-disk cache
+MENU_CACHE_EXPIRE = 3600
+
+# Sentinel that starts the state script, located before any regex work
+PRELOADED_STATE_MARKER = b'window.__PRELOADED_STATE__'
+
+# Read size when streaming restaurant pages
+STREAM_CHUNK_SIZE = 65536
+
+# Matches the JSON.parse("...") string literal, honouring escaped quotes.
+# The unrolled loop has no overlapping alternatives, so it cannot backtrack catastrophically.
+PRELOADED_STATE_RE = re.compile(
+    rb'window\.__PRELOADED_STATE__\s*=\s*JSON\.parse\(("[^"\\]*(?:\\.[^"\\]*)*")\);'
+)
+
+# Numeric suffix left on list values by flatten_dict (e.g. tag_slugs_0)
+NUM_SUFFIX_RE = re.compile(r'_\d+$')
+
+# Indexed tag columns to combine, keyed by the combined column name
+TAG_PATTERNS = {
+    'tag_slugs': re.compile(r'tag_slugs_\d+'),
+    'service_slugs': re.compile(r'service_slugs_\d+'),
+    'dietary_slugs': re.compile(r'dietary_slugs_\d+')
+}
 
 def clean_column_name(col: str) -> str:
     """Clean column names for better readability"""
     # Remove numeric suffixes from tag columns
-    col = re.sub(r'_\d+$', '', col)
+    col = NUM_SUFFIX_RE.sub('', col)
     # Remove unnecessary prefixes
     col = col.replace('item_', '')
     # Special handling for specific columns
@@ -16,7 +74,7 @@ def clean_column_name(col: str) -> str:
         return 'item_name'
     return col
 
-def organize_columns(df: pd.DataFrame) -> pd.DataFrame:
+def organize_columns(table: pa.Table) -> pa.Table:
     """Organize columns in a logical order"""
     # Priority columns that should appear first
     priority_cols = [
@@ -26,69 +84,140 @@ def organize_columns(df: pd.DataFrame) -> pd.DataFrame:
     ]
     
     # Get existing columns that are in priority list
-    existing_priority_cols = [col for col in priority_cols if col in df.columns]
+    existing_priority_cols = [col for col in priority_cols if col in table.column_names]
     
     # Get remaining columns
-    other_cols = [col for col in df.columns if col not in existing_priority_cols]
+    other_cols = [col for col in table.column_names if col not in existing_priority_cols]
     
-    # Return reorganized dataframe
-    return df[existing_priority_cols + other_cols]
+    # Return reorganized table
+    return table.select(existing_priority_cols + other_cols)
 
-def clean_tag_columns(df: pd.DataFrame) -> pd.DataFrame:
+def clean_tag_columns(table: pa.Table) -> pa.Table:
     """Combine multiple tag columns into single columns with comma-separated values"""
-    # Identify tag columns
-    tag_patterns = {
-        'tag_slugs': r'tag_slugs_\d+',
-        'service_slugs': r'service_slugs_\d+',
-        'dietary_slugs': r'dietary_slugs_\d+'
-    }
-    
-    for new_col, pattern in tag_patterns.items():
-        matching_cols = [col for col in df.columns if re.match(pattern, col)]
-        if matching_cols:
-            # Combine values from all matching columns
-            df[new_col] = df[matching_cols].apply(
-                lambda x: ', '.join(filter(None, x.dropna())), axis=1
-            )
-            # Drop original columns
-            df.drop(columns=matching_cols, inplace=True)
+    for new_col, pattern in TAG_PATTERNS.items():
+        # Match by position, since cleaned names can repeat
+        matching = [i for i, col in enumerate(table.column_names) if pattern.match(col)]
+        if matching:
+            # Treat empty tags as missing so they are skipped in the join
+            tags = []
+            for i in matching:
+                tag = pc.cast(table.column(i), pa.string())
+                tags.append(pc.if_else(pc.equal(tag, ''), pa.scalar(None, pa.string()), tag))
+            
+            # Join pairwise, falling back to whichever side is present
+            combined = tags[0]
+            for tag in tags[1:]:
+                combined = pc.coalesce(pc.binary_join_element_wise(combined, tag, ', '), combined, tag)
             
-    return df
+            # Replace original columns with the combined one
+            table = table.append_column(new_col, pc.fill_null(combined, ''))
+            table = table.select([i for i in range(table.num_columns) if i not in matching])
+            
+    return table
 
-def extract_menu_data(url: str) -> pd.DataFrame:
-    """Extract menu data from the website"""
-    # Fetch page content with headers
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    # Find preloaded state script using string parameter
-    script_tag = soup.find('script', string=lambda text: text and '__PRELOADED_STATE__' in text)
-    if not script_tag:
-        # Try alternative search method
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string and '__PRELOADED_STATE__' in script.string:
-                script_tag = script
-                break
+def to_arrow_column(values: List[Any]) -> pa.Array:
+    """Convert one column of scraped values, keeping mixed-type columns as strings"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+def to_numeric(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Cast a column to float, turning unparseable values into nulls"""
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) or pa.types.is_boolean(column.type):
+        return column
+    try:
+        return pc.cast(column, pa.float64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        pass
     
-    if not script_tag:
+    def parse(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    
+    return pa.chunked_array([pa.array([parse(v) for v in column.to_pylist()], pa.float64())])
+
+def find_restaurant_id(state_json: bytes) -> str:
+    """Find the first restaurant id in the preloaded state without decoding it"""
+    for prefix, event, value in ijson.parse(io.BytesIO(state_json)):
+        if prefix == 'pages.restaurant' and event == 'map_key':
+            return value
+    raise ValueError("Restaurant data not found")
+
+@functools.lru_cache(maxsize=None)
+def open_menu_cache(cache_dir: str) -> diskcache.Cache:
+    """Open the on-disk menu cache, reusing it across calls"""
+    return diskcache.Cache(cache_dir)
+
+def menu_cache_key(url: str) -> str:
+    """Cache key for a restaurant page URL"""
+    return hashlib.sha256(url.encode()).hexdigest()
+
+def extract_state_json(html: bytes) -> bytes:
+    """Pull the raw preloaded state JSON out of a restaurant page's undecoded HTML"""
+    # Jump to the state script with a plain substring search, then match only from there
+    start = html.find(PRELOADED_STATE_MARKER)
+    while start != -1:
+        match = PRELOADED_STATE_RE.match(html, start)
+        if match:
+            break
+        start = html.find(PRELOADED_STATE_MARKER, start + 1)
+    else:
         raise ValueError("Preloaded state not found")
     
-    # Extract JSON with improved regex
-    match = re.search(r'window\.__PRELOADED_STATE__\s*=\s*JSON\.parse\((.*?)\);', script_tag.string)
-    if not match:
-        raise ValueError("Could not extract JSON data")
+    # Unescape the JSON.parse string literal once, leaving the raw state JSON
+    return orjson.loads(match.group(1)).encode()
+
+def fetch_state_json(url: str, cache_dir: Optional[str] = None) -> bytes:
+    """Fetch the raw preloaded state JSON for a restaurant page, using the cache in cache_dir if given"""
+    cache = open_menu_cache(cache_dir) if cache_dir else None
+    key = menu_cache_key(url)
+    if cache is not None:
+        state_json = cache.get(key)
+        if state_json is not None:
+            return state_json
     
-    json_str = match.group(1)
-    preloaded_state = json.loads(json.loads(json_str))
+    # Stream the page and stop reading once the state script has fully arrived
+    buf = bytearray()
+    state_json = None
+    start = -1
+    with session.get(url, stream=True) as response:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            # Only scan the new chunk plus enough overlap to catch a marker or '");' split across chunks
+            search_from = len(buf)
+            buf.extend(chunk)
+            if start == -1:
+                start = buf.find(PRELOADED_STATE_MARKER, max(search_from - len(PRELOADED_STATE_MARKER), 0))
+            if start == -1 or buf.find(b'");', max(search_from - 2, start)) == -1:
+                continue
+            try:
+                state_json = extract_state_json(buf)
+                break
+            except ValueError:
+                # The terminator was inside the string literal; keep reading
+                continue
     
-    # Get restaurant data
-    restaurant_data = preloaded_state['pages']['restaurant']
-    restaurant_id = list(restaurant_data.keys())[0]
-    menu_data = restaurant_data[restaurant_id]['order']['menuList']['menus']
+    if state_json is None:
+        state_json = extract_state_json(buf)
+    if cache is not None:
+        cache.set(key, state_json, expire=MENU_CACHE_EXPIRE)
+    return state_json
+
+def extract_menu_data(url: str, cache_dir: Optional[str] = None) -> pa.Table:
+    """Extract menu data from the website"""
+    return parse_menu_data(fetch_state_json(url, cache_dir))
+
+def parse_menu_data(state_json: bytes) -> pa.Table:
+    """Build the raw menu table from preloaded state JSON"""
+    # Stream only the menus array instead of materializing the whole state
+    restaurant_id = find_restaurant_id(state_json)
+    menu_data = ijson.items(
+        io.BytesIO(state_json),
+        f'pages.restaurant.{restaurant_id}.order.menuList.menus.item',
+        use_float=True
+    )
     
     # Extract items
     all_items = []
@@ -104,74 +233,179 @@ def extract_menu_data(url: str) -> pd.DataFrame:
                 flat_item['category'] = category_name
                 all_items.append(flat_item)
     
-    return pd.DataFrame(all_items)
+    # Build one Arrow column per key; items missing a key get a null there
+    keys = dict.fromkeys(key for item in all_items for key in item)
+    return pa.Table.from_arrays(
+        [to_arrow_column([item.get(key) for item in all_items]) for key in keys],
+        names=list(keys)
+    )
 
 def flatten_dict(d: Dict, parent_key: str = '', sep: str = '_') -> Dict:
     """Flatten nested dictionary"""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            # Handle list values by creating indexed keys
-            for i, item in enumerate(v):
-                if isinstance(item, (dict, list)):
-                    # Skip complex nested structures in lists
-                    continue
-                items.append((f"{new_key}_{i}", item))
+    flat = {}
+    # Walk with an explicit stack of iterators to keep depth-first key order without recursion
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            new_key = f"{prefix}{sep}{k}" if prefix else k
+            
+            if isinstance(v, dict):
+                # Descend first, resume this level once the child is done
+                stack.append((new_key, iter(v.items())))
+                break
+            elif isinstance(v, list):
+                # Handle list values by creating indexed keys
+                for i, item in enumerate(v):
+                    if isinstance(item, (dict, list)):
+                        # Skip complex nested structures in lists
+                        continue
+                    flat[f"{new_key}_{i}"] = item
+            else:
+                flat[new_key] = v
         else:
-            items.append((new_key, v))
+            stack.pop()
     
-    return dict(items)
+    return flat
 
-def process_menu_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Process and clean the menu dataframe"""
+def process_menu_data(table: pa.Table) -> pa.Table:
+    """Process and clean the menu table"""
     # Clean column names
-    df.columns = [clean_column_name(col) for col in df.columns]
+    table = table.rename_columns([clean_column_name(col) for col in table.column_names])
     
     # Convert numeric columns
     numeric_cols = ['price', 'rating_value', 'min_price', 'max_price', 'default_price', 'display_price']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='ignore')
+    for i, col in enumerate(table.column_names):
+        if col in numeric_cols:
+            table = table.set_column(i, col, to_numeric(table.column(i)))
     
     # Clean up and combine tag columns
-    df = clean_tag_columns(df)
+    table = clean_tag_columns(table)
     
-    # Remove duplicate columns
-    df = df.loc[:, ~df.columns.duplicated()]
+    # Remove duplicate columns, keeping the first occurrence
+    first_seen = {}
+    for i, col in enumerate(table.column_names):
+        first_seen.setdefault(col, i)
+    table = table.select(list(first_seen.values()))
     
     # Organize columns
-    df = organize_columns(df)
+    table = organize_columns(table)
     
     # Drop redundant or unnecessary columns
     cols_to_drop = ['fb_slug', 'name_slug', 'item_metadata', 'tracking_dish_type',
                     'item_tag_image', 'tag_images', 'tag_texts', 'tag_objects']
-    df.drop(columns=[col for col in cols_to_drop if col in df.columns], inplace=True)
+    table = table.drop_columns([col for col in cols_to_drop if col in table.column_names])
     
     # Sort by category and price
-    df = df.sort_values(['category', 'price'])
+    table = table.sort_by([('category', 'ascending'), ('price', 'ascending')])
     
-    return df
+    return table
+
+def build_menu(state_json: bytes) -> pa.Table:
+    """Parse and process preloaded state JSON into a clean menu table"""
+    return process_menu_data(parse_menu_data(state_json))
+
+def build_menu_from_html(html: bytes) -> Tuple[bytes, pa.Table]:
+    """Extract the preloaded state from page HTML and build its menu table"""
+    state_json = extract_state_json(html)
+    return state_json, build_menu(state_json)
+
+async def get_with_retries(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    """GET a URL, retrying transient errors with the same policy as the requests session"""
+    for attempt in range(RETRY_TOTAL + 1):
+        last_attempt = attempt == RETRY_TOTAL
+        delay = RETRY_BACKOFF * 2 ** attempt
+        try:
+            response = await client.get(url)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            # Honour a numeric Retry-After over the exponential backoff
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = int(retry_after)
+        await asyncio.sleep(delay)
+
+async def scrape_many(urls: List[str], max_concurrent: int = 20,
+                      cache_dir: Optional[str] = None) -> Dict[str, pa.Table]:
+    """
+    Scrape several restaurant menus at once.
+    
+    Pages are fetched concurrently over one HTTP/2 client, retrying
+    transient errors like the requests session does. State extraction,
+    parsing and cleaning run in a process pool, and cache access in a
+    thread, so neither blocks the downloads still in flight.
+    
+    Args:
+        urls: Restaurant order page URLs
+        max_concurrent: Maximum number of page fetches in flight at once
+        cache_dir: Directory for the on-disk menu cache, or None to always fetch
+        
+    Returns:
+        Dictionary mapping each successfully scraped URL to its menu table
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    loop = asyncio.get_running_loop()
+    menus = {}
+    cache = open_menu_cache(cache_dir) if cache_dir else None
+    
+    async def scrape_one(client: httpx.AsyncClient, pool: ProcessPoolExecutor, url: str):
+        try:
+            key = menu_cache_key(url)
+            state_json = await asyncio.to_thread(cache.get, key) if cache is not None else None
+            if state_json is not None:
+                menus[url] = await loop.run_in_executor(pool, build_menu, state_json)
+            else:
+                async with semaphore:
+                    response = await get_with_retries(client, url)
+                    response.raise_for_status()
+                state_json, menus[url] = await loop.run_in_executor(
+                    pool, build_menu_from_html, response.content
+                )
+                if cache is not None:
+                    await asyncio.to_thread(cache.set, key, state_json, expire=MENU_CACHE_EXPIRE)
+            
+            print(f"Scraped {len(menus[url])} items from {url}")
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+    
+    with ProcessPoolExecutor() as pool:
+        async with httpx.AsyncClient(http2=True, headers=HEADERS, timeout=30.0,
+                                     follow_redirects=True) as client:
+            async with asyncio.TaskGroup() as tg:
+                for url in urls:
+                    tg.create_task(scrape_one(client, pool, url))
+    
+    return menus
+
+def write_menu(table: pa.Table, output_path: str):
+    """Write menu data as zstd-compressed Parquet for .parquet paths, CSV otherwise"""
+    if output_path.endswith('.parquet'):
+        pq.write_table(table, output_path, compression='zstd')
+    else:
+        # pandas' CSV writer keeps the existing output format
+        table.to_pandas().to_csv(output_path, index=False)
 
-def save_menu(url: str, output_path: str):
-    """Extract menu data, process it, and save to CSV"""
+def save_menu(url: str, output_path: str, cache_dir: Optional[str] = None):
+    """Extract menu data, process it, and save to Parquet or CSV"""
     try:
         # Extract raw data
         print("Extracting menu data...")
-        df = extract_menu_data(url)
+        table = extract_menu_data(url, cache_dir)
         
         # Process and clean data
         print("Processing and cleaning data...")
-        df = process_menu_data(df)
+        table = process_menu_data(table)
         
-        # Save to CSV
-        df.to_csv(output_path, index=False)
+        # Save to Parquet or CSV based on the output extension
+        write_menu(table, output_path)
         print(f"\nProcessed menu data saved to {output_path}")
         
-        # Print summary statistics
+        # Print summary statistics; only the two columns involved go to pandas
+        df = table.select(['category', 'price']).to_pandas()
         print("\nMenu Summary:")
         print(f"Total items: {len(df)}")
         print("\nItems per category:")
@@ -186,10 +420,11 @@ def save_menu(url: str, output_path: str):
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) != 3:
-        print("Usage: python script.py <restaurant_url> <output_csv_path>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python script.py <restaurant_url> <output_path.csv|.parquet> [cache_dir]")
         sys.exit(1)
         
     url = sys.argv[1]
     output_path = sys.argv[2]
-    save_menu(url, output_path)
\ No newline at end of file
+    cache_dir = sys.argv[3] if len(sys.argv) == 4 else None
+    save_menu(url, output_path, cache_dir)
\ No newline at end of file